@@ -40,8 +40,9 @@
 ###########################################################################
 
 # Imports
+from functools import lru_cache
 from math import pi
-from numpy import ones,linspace,sin,cos,column_stack
+from numpy import ones,empty,linspace,sin,cos,concatenate,asarray
 from time import sleep
 from matplotlib import colormaps
 from matplotlib.colors import Normalize
@@ -72,6 +73,16 @@ CIRCLE_POINTS = 64
 
 # Globals
 __qdwindow__ = None
+__qdshapes__ = {}
+
+# Memoized cmap(norm(value)) lookup: draw loops map the same scalar values
+# over and over and the matplotlib call dominates otherwise. Keys are
+# rounded to 6 places and the cache is bounded, so an animation feeding
+# continuously varying values cannot grow it without limit.
+@lru_cache(maxsize=4096)
+def __lookupcolor__(value):
+    w = __qdwindow__
+    return w.cmap(w.norm(value))[:3]
 
 # Classes
 
@@ -97,6 +108,7 @@ class window():
         # Set the color, mode, and colormap
         self.cmap = colormaps[DEFAULT_CMAP]
         self.norm = Normalize(DEFAULT_VMIN,DEFAULT_VMAX)
+        __lookupcolor__.cache_clear()
         self.screen.colormode(1)
         self.screen.bgcolor(mapcolor(bgcolor))
         self.screen.tracer(False)
@@ -138,11 +150,16 @@ class line(Turtle):
         if self.visibleon:
             n = min(len(x),len(y))
             if n<1: return
+            screen = self.screen
+            tracing = screen.tracer()
+            if tracing: screen.tracer(False)
             self.clear()
             self.setpos(x[0],y[0])
             self.pendown()
-            for k in range(1,n): self.setpos(x[k],y[k])
+            goto = self.setpos
+            for p in zip(x[1:n],y[1:n]): goto(p)
             self.penup()
+            if tracing: screen.tracer(tracing)
 
     # Set color
     def setcolor(self,color):
@@ -177,11 +194,13 @@ class shape(Turtle):
     def setpos(self,x,y=None):
         super().setpos(x,y)
         if self.streamon:
-            self.streamx[1:] = self.streamx[:-1]
-            self.streamy[1:] = self.streamy[:-1]
-            if y is None: self.streamx[0],self.streamy[0] = x
-            else: self.streamx[0],self.streamy[0] = x,y
-            self.streamer.setline(self.streamx,self.streamy)
+            # Ring buffer: write the newest point at the head instead of
+            # shifting the whole trail by one slot every frame
+            h = self.streamhead = (self.streamhead-1)%self.streamlength
+            if y is None: self.streamx[h],self.streamy[h] = x
+            else: self.streamx[h],self.streamy[h] = x,y
+            self.streamer.setline(concatenate((self.streamx[h:],self.streamx[:h])),
+                                  concatenate((self.streamy[h:],self.streamy[:h])))
 
     # Set angle
     def setangle(self,angle):
@@ -224,6 +243,7 @@ class shape(Turtle):
                 self.streamy = y*ones(length,float)
                 self.streamon = True
                 self.streamlength = length
+                self.streamhead = 0
             else:
                 # Trail
                 self.width(width)
@@ -293,9 +313,12 @@ class rectangle(shape):
         else:
             ls,rs = w.xfactor*left,w.xfactor*right
             bs,ts = w.yfactor*bottom,w.yfactor*top
-        h = hash((left,right,bottom,top))
-        name = "qdrectangle" + str(h)
-        register_shape(name,((-ls,-bs),(-ls,-ts),(-rs,-ts),(-rs,-bs)))
+        pathtuple = ((-ls,-bs),(-ls,-ts),(-rs,-ts),(-rs,-bs))
+        name = __qdshapes__.get(pathtuple)
+        if name is None:
+            name = "qdrectangle" + str(len(__qdshapes__))
+            register_shape(name,pathtuple)
+            __qdshapes__[pathtuple] = name
         self.shape(name)
         self.turtlesize(outline=olwidth)
         if pos is None: self.setpos(w.center)
@@ -314,9 +337,11 @@ class polygon(shape):
             pathtuple = tuple((-x,-y) for (x,y) in path)
         else:
             pathtuple = tuple((-w.xfactor*x,-w.yfactor*y) for (x,y) in path)
-        h = hash(pathtuple)
-        name = "qdpoly" + str(h)
-        register_shape(name,pathtuple)
+        name = __qdshapes__.get(pathtuple)
+        if name is None:
+            name = "qdpoly" + str(len(__qdshapes__))
+            register_shape(name,pathtuple)
+            __qdshapes__[pathtuple] = name
         self.shape(name)
         self.turtlesize(outline=olwidth)
         if pos is None: self.setpos(w.center)
@@ -349,9 +374,25 @@ class grid():
 
     # Update complete grid
     def setgrid(self,value):
+        # Map the whole array of cell values through the colormap in one
+        # vectorized call instead of one cmap(norm()) lookup per cell
+        try:
+            values = asarray(value,float)
+        except (TypeError,ValueError):
+            for i in range(self.xsize):
+                for j in range(self.ysize):
+                    self.grid[i][j].setcolor(color=value[i,j],olcolor=self.olcolor)
+            return
+        w = __qdwindow__
+        colors = w.cmap(w.norm(values))
+        olcolor = None if self.olcolor is None else mapcolor(self.olcolor)
         for i in range(self.xsize):
+            row = self.grid[i]
+            rowcolors = colors[i]
             for j in range(self.ysize):
-                self.grid[i][j].setcolor(color=value[i,j],olcolor=self.olcolor)
+                fill = (rowcolors[j,0],rowcolors[j,1],rowcolors[j,2])
+                if olcolor is None: row[j].color(fill)
+                else: row[j].color(olcolor,fill)
 
     # Update a single grid point
     def setpoint(self,i,j,value):
@@ -362,9 +403,14 @@ class grid():
 # Register new shapes
 def makeshapes():
 
+    # Shapes registered for earlier windows are gone with their screen
+    __qdshapes__.clear()
+
     # Circle with diameter 1
     theta = linspace(0,2*pi,CIRCLE_POINTS,endpoint=False)
-    c = column_stack((0.5*cos(theta),0.5*sin(theta)))
+    c = empty((CIRCLE_POINTS,2))
+    c[:,0] = 0.5*cos(theta)
+    c[:,1] = 0.5*sin(theta)
     register_shape("__qdcircle__",tuple(c))
 
     # Square with side length 1
@@ -465,8 +511,7 @@ def mapcolor(color):
         if len(color)>1: return color
     except:
         pass
-    w = __qdwindow__
-    return w.cmap(w.norm(float(color)))[:3]
+    return __lookupcolor__(round(float(color),6))
 
 # Set color map
 def setcmap(cmap=DEFAULT_CMAP,vmin=None,vmax=None):
@@ -474,6 +519,7 @@ def setcmap(cmap=DEFAULT_CMAP,vmin=None,vmax=None):
     w.cmap = colormaps[cmap]
     if vmin is not None and vmax is not None:
         w.norm = Normalize(vmin,vmax)
+    __lookupcolor__.cache_clear()
 
 # Helper function for catching close-window events
 def wclose():